@@ -2,6 +2,8 @@ import asyncio
 import json
 import logging
 import os
+import threading
+import time
 from pathlib import Path
 from typing import Callable, Optional, TYPE_CHECKING
 import socket
@@ -22,7 +24,8 @@ logger = logging.getLogger(__name__)
 class ConfigServer:
     """HTTP 服务器用于管理 MCP 服务器配置文件"""
     
-    def __init__(self, config_dir: str, port: int = 0, on_config_update: Optional[Callable] = None):
+    def __init__(self, config_dir: str, port: int = 0, on_config_update: Optional[Callable] = None,
+                 idle_timeout: float = 0):
         """
         初始化配置服务器
         
@@ -30,6 +33,7 @@ class ConfigServer:
             config_dir: 配置文件目录
             port: 监听端口，0 表示自动分配
             on_config_update: 配置更新时的回调函数
+            idle_timeout: 无请求且无 SSE 连接多少秒后自动关闭，0 表示不自动关闭
         """
         self.config_dir = Path(config_dir)
         self.config_file = self.config_dir / "mcp_servers.json"
@@ -41,10 +45,13 @@ class ConfigServer:
         self.runner: Optional[web.AppRunner] = None
         self.site: Optional[web.TCPSite] = None
         self._server_task: Optional[asyncio.Task] = None
+        self.idle_timeout = idle_timeout
+        self._idle_task: Optional[asyncio.Task] = None
+        self._last_activity = time.monotonic()
         
         # MCP 服务器状态管理(运行时状态,不保存到文件)
-        # 状态: "stopped", "starting", "running", "error"
-        self.server_status: dict = {}  # {server_name: {"status": str, "error": str|None}}
+        # 状态: "stopped", "starting", "running", "degraded", "error"
+        self.server_status: dict = {}  # {server_name: {"status": str, "error": str|None, "latency": dict|None, "usage": dict|None}}
         # SSE 客户端连接
         self._sse_clients: list = []
         
@@ -253,37 +260,82 @@ class ConfigServer:
             if client in self._sse_clients:
                 self._sse_clients.remove(client)
     
-    def update_server_status(self, server_name: str, status: str, error: Optional[str] = None):
+    def update_server_status(self, server_name: str, status: str, error: Optional[str] = None,
+                             latency: Optional[dict] = None):
         """
         更新服务器状态（运行时状态，不保存到文件）
         调用后会自动通过 SSE 推送给所有连接的客户端
         
         Args:
             server_name: 服务器名称
-            status: 服务器状态，可选值: "stopped", "starting", "running", "error"
+            status: 服务器状态，可选值: "stopped", "starting", "running", "degraded", "error"
             error: 错误信息（可选，通常在 status="error" 时使用）
+            latency: 健康探测的延迟统计（可选，如 avg_rtt_ms、p95_rtt_ms、error_rate）
         
         状态说明:
             - stopped: 服务器已停止
             - starting: 服务器启动中
             - running: 服务器正常运行
+            - degraded: 服务器可用但响应慢或偶有失败
             - error: 服务器出现错误
         """
-        valid_statuses = ["stopped", "starting", "running", "error"]
+        valid_statuses = ["stopped", "starting", "running", "degraded", "error"]
         if status not in valid_statuses:
             logger.warning(f"无效的状态值: {status}, 将使用 'stopped'")
             status = "stopped"
         
+        previous = self.server_status.get(server_name, {})
         self.server_status[server_name] = {
             "status": status,
-            "error": error
+            "error": error,
+            "latency": latency,
+            "usage": previous.get("usage")
         }
-        logger.info(f"更新服务器状态: {server_name} - status: {status}, error: {error}")
+        # 周期性探测会频繁刷新延迟数据，只有状态变化时才记录 info 日志
+        if previous.get("status") != status or previous.get("error") != error:
+            logger.info(f"更新服务器状态: {server_name} - status: {status}, error: {error}")
+        else:
+            logger.debug(f"刷新服务器延迟: {server_name} - {latency}")
         
         # 广播状态更新
         if self._sse_clients:
             asyncio.create_task(self._broadcast_status())
     
+    def update_server_usage(self, server_name: str, usage: dict):
+        """
+        更新 stdio 服务器的资源使用情况（运行时状态，不保存到文件）
+        调用后会自动通过 SSE 推送给所有连接的客户端
+        
+        Args:
+            server_name: 服务器名称
+            usage: 资源使用情况，如 rss_mb、cpu_percent、fds、memory_mb、restarts
+        """
+        entry = self.server_status.setdefault(server_name, {
+            "status": "starting",
+            "error": None,
+            "latency": None
+        })
+        entry["usage"] = usage
+        
+        # 广播状态更新
+        if self._sse_clients:
+            asyncio.create_task(self._broadcast_status())
+    
+    async def _idle_watchdog(self):
+        """空闲超时后自动关闭服务器，有 SSE 连接时视为仍在使用"""
+        try:
+            while True:
+                await asyncio.sleep(min(self.idle_timeout, 30))
+                if self._sse_clients:
+                    self._last_activity = time.monotonic()
+                    continue
+                if time.monotonic() - self._last_activity >= self.idle_timeout:
+                    logger.info(f"配置服务器空闲超过 {self.idle_timeout} 秒，自动关闭")
+                    await self.stop()
+                    return
+        except asyncio.CancelledError:
+            pass
+    
     def _setup_routes(self):
         """设置路由"""
         if self.app is not None:
@@ -308,8 +360,14 @@ class ConfigServer:
         if web is None:
             raise RuntimeError("aiohttp 未安装，请运行: pip install aiohttp")
         
+        @web.middleware
+        async def track_activity(request: web.Request, handler: Callable):
+            """记录最近一次请求时间，用于空闲自动关闭"""
+            self._last_activity = time.monotonic()
+            return await handler(request)
+        
         # 创建应用
-        self.app = web.Application()
+        self.app = web.Application(middlewares=[track_activity])
         self._setup_routes()
         
         # 找一个可用端口
@@ -324,6 +382,10 @@ class ConfigServer:
             if self.site is not None:
                 await self.site.start()
         
+        self._last_activity = time.monotonic()
+        if self.idle_timeout > 0:
+            self._idle_task = asyncio.create_task(self._idle_watchdog())
+        
         server_url = self.get_server_url()
         logger.info(f"配置服务器已启动: {server_url}")
         
@@ -335,6 +397,11 @@ class ConfigServer:
             logger.warning("服务器未运行")
             return
         
+        # 空闲关闭时 stop 由 watchdog 自身调用，不能取消自己
+        if self._idle_task is not None and self._idle_task is not asyncio.current_task():
+            self._idle_task.cancel()
+        self._idle_task = None
+        
         try:
             await self.runner.cleanup()
             logger.info("配置服务器已关闭")
@@ -368,6 +435,89 @@ class ConfigServer:
             await self.stop()
 
 
+class ThreadedConfigServer:
+    """
+    在独立的事件循环线程中运行 ConfigServer，与工具调用所在的事件循环隔离
+    
+    UI 请求、配置文件读写、SSE 心跳和广播都在服务器线程中执行；
+    调用方通过线程安全的命令通道（start/stop/update_*）与其交互，
+    配置更新事件会被投递回调用方的事件循环执行。
+    """
+    
+    def __init__(self, config_dir: str, port: int = 0, on_config_update: Optional[Callable] = None,
+                 idle_timeout: float = 0, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        初始化并启动服务器线程（HTTP 服务器需调用 start 才会监听）
+        
+        Args:
+            config_dir: 配置文件目录
+            port: 监听端口，0 表示自动分配
+            on_config_update: 配置更新时的回调函数，在调用方的事件循环中执行
+            idle_timeout: 无请求且无 SSE 连接多少秒后自动关闭，0 表示不自动关闭
+            loop: 接收配置更新事件的事件循环，默认为当前运行中的事件循环
+        """
+        self.on_config_update = on_config_update
+        self._caller_loop = loop or asyncio.get_running_loop()
+        self.server = ConfigServer(
+            config_dir=config_dir,
+            port=port,
+            on_config_update=self._forward_config_update,
+            idle_timeout=idle_timeout
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="config-server", daemon=True)
+        self._thread.start()
+    
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+    
+    def _forward_config_update(self, config_data: dict):
+        """在服务器线程中被调用，把配置更新事件投递到调用方的事件循环"""
+        if not self.on_config_update:
+            return
+        if asyncio.iscoroutinefunction(self.on_config_update):
+            asyncio.run_coroutine_threadsafe(self.on_config_update(config_data), self._caller_loop)
+        else:
+            self._caller_loop.call_soon_threadsafe(self.on_config_update, config_data)
+    
+    async def _submit(self, coro):
+        """在服务器线程中执行协程，并在调用方的事件循环中等待结果"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+    
+    async def start(self) -> str:
+        """启动 HTTP 服务器，返回服务器地址"""
+        return await self._submit(self.server.start())
+    
+    async def stop(self):
+        """关闭 HTTP 服务器"""
+        await self._submit(self.server.stop())
+    
+    def update_server_status(self, server_name: str, status: str, error: Optional[str] = None,
+                             latency: Optional[dict] = None):
+        """线程安全地更新服务器状态，参数同 ConfigServer.update_server_status"""
+        self._loop.call_soon_threadsafe(self.server.update_server_status, server_name, status, error, latency)
+    
+    def update_server_usage(self, server_name: str, usage: dict):
+        """线程安全地更新资源使用情况，参数同 ConfigServer.update_server_usage"""
+        self._loop.call_soon_threadsafe(self.server.update_server_usage, server_name, usage)
+    
+    def get_server_url(self) -> str:
+        """获取服务器地址"""
+        return self.server.get_server_url()
+    
+    def is_running(self) -> bool:
+        """检查服务器是否正在运行"""
+        return self.server.is_running()
+    
+    async def close(self):
+        """关闭 HTTP 服务器并停止服务器线程的事件循环"""
+        if self.is_running():
+            await self.stop()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        await asyncio.to_thread(self._thread.join, 5)
+
+
 # 示例使用
 if __name__ == "__main__":
     async def on_update(config_data):
@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 探测函数: 成功时正常返回（可返回自测的 RTT 毫秒数），失败时抛出异常
+ProbeFunc = Callable[[], Awaitable[Optional[float]]]
+# 状态回调: (server_name, status, error, latency)
+StatusCallback = Callable[[str, str, Optional[str], dict], None]
+
+# 单次探测的默认超时（秒）
+DEFAULT_PROBE_TIMEOUT = 5.0
+
+# mcp_servers.json 中 "health" 配置项允许的字段及类型
+HEALTH_OPTION_TYPES = {
+    "interval": float,
+    "timeout": float,
+    "degraded_rtt_ms": float,
+    "degraded_error_rate": float,
+    "error_after": int,
+}
+
+
+def parse_health_options(name: str, options) -> dict:
+    """
+    校验服务器配置中的 "health" 项，忽略未知字段和无法转换的值（记录警告而不抛出异常）
+
+    Args:
+        name: 服务器名称，仅用于日志
+        options: 配置中的原始 "health" 值
+
+    Returns:
+        可直接传给 HealthProber.add_server 的关键字参数
+    """
+    if options is None:
+        return {}
+    if not isinstance(options, dict):
+        logger.warning(f"服务器 {name} 的 health 配置不是对象，已忽略: {options!r}")
+        return {}
+    parsed = {}
+    for key, value in options.items():
+        if key not in HEALTH_OPTION_TYPES:
+            logger.warning(f"服务器 {name} 的 health 配置包含未知字段，已忽略: {key}")
+            continue
+        try:
+            if isinstance(value, bool):
+                raise ValueError("布尔值无效")
+            parsed[key] = HEALTH_OPTION_TYPES[key](value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"服务器 {name} 的 health 配置 {key}={value!r} 无效，已忽略: {e}")
+            continue
+        if parsed[key] <= 0:
+            logger.warning(f"服务器 {name} 的 health 配置 {key}={value!r} 必须大于 0，已忽略")
+            del parsed[key]
+    return parsed
+
+
+class ServerHealth:
+    """单个 MCP 服务器的滚动健康统计"""
+
+    def __init__(self, name: str, window: int = 20, measure_rtt: bool = True):
+        """
+        Args:
+            name: 服务器名称
+            window: 滚动窗口大小（保留最近多少次探测结果）
+            measure_rtt: RTT 是否代表该服务器自身的延迟
+        """
+        self.name = name
+        self.measure_rtt = measure_rtt
+        # 最近的探测结果: (是否成功, RTT 毫秒数)
+        self.samples: deque = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.total_probes = 0
+        self.last_rtt_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_probe_at: Optional[float] = None
+        self.status = "starting"
+
+    def record(self, ok: bool, rtt_ms: Optional[float], error: Optional[str] = None):
+        """记录一次探测结果"""
+        self.samples.append((ok, rtt_ms))
+        self.total_probes += 1
+        self.last_probe_at = time.time()
+        if ok:
+            self.consecutive_failures = 0
+            self.last_rtt_ms = rtt_ms
+            self.last_error = None
+        else:
+            self.consecutive_failures += 1
+            self.last_error = error
+
+    @property
+    def has_succeeded(self) -> bool:
+        """窗口内是否至少有一次成功的探测"""
+        return any(ok for ok, _ in self.samples)
+
+    @property
+    def error_rate(self) -> float:
+        """窗口内的失败比例"""
+        if not self.samples:
+            return 0.0
+        failures = sum(1 for ok, _ in self.samples if not ok)
+        return failures / len(self.samples)
+
+    def _rtts(self) -> list:
+        return sorted(rtt for ok, rtt in self.samples if ok and rtt is not None)
+
+    @property
+    def avg_rtt_ms(self) -> Optional[float]:
+        """窗口内成功探测的平均 RTT"""
+        rtts = self._rtts()
+        if not rtts:
+            return None
+        return sum(rtts) / len(rtts)
+
+    @property
+    def p95_rtt_ms(self) -> Optional[float]:
+        """窗口内成功探测的 p95 RTT"""
+        rtts = self._rtts()
+        if not rtts:
+            return None
+        index = min(len(rtts) - 1, int(round(0.95 * (len(rtts) - 1))))
+        return rtts[index]
+
+    def latency(self) -> dict:
+        """返回可直接 JSON 序列化的延迟统计"""
+        def _round(value: Optional[float]) -> Optional[float]:
+            return round(value, 1) if value is not None else None
+
+        return {
+            "last_rtt_ms": _round(self.last_rtt_ms),
+            "avg_rtt_ms": _round(self.avg_rtt_ms),
+            "p95_rtt_ms": _round(self.p95_rtt_ms),
+            "error_rate": round(self.error_rate, 3),
+            "samples": len(self.samples),
+            "rtt_measured": self.measure_rtt,
+            "last_probe_at": self.last_probe_at,
+        }
+
+
+class HealthProber:
+    """后台健康探测器，按各服务器自己的周期探测并统计 RTT 与错误率"""
+
+    def __init__(self, on_status: Optional[StatusCallback] = None, window: int = 20):
+        """
+        初始化健康探测器
+
+        Args:
+            on_status: 每次探测后调用的状态回调 (server_name, status, error, latency)
+            window: 每个服务器保留的探测样本数
+        """
+        self.on_status = on_status
+        self.window = window
+        self.health: Dict[str, ServerHealth] = {}
+        self._probes: Dict[str, ProbeFunc] = {}
+        self._options: Dict[str, dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add_server(
+        self,
+        name: str,
+        probe: ProbeFunc,
+        interval: float = 30.0,
+        timeout: float = DEFAULT_PROBE_TIMEOUT,
+        degraded_rtt_ms: float = 1000.0,
+        degraded_error_rate: float = 0.2,
+        error_after: int = 3,
+        measure_rtt: bool = True,
+    ):
+        """
+        注册一个需要探测的服务器
+
+        Args:
+            name: 服务器名称
+            probe: 探测协程函数
+            interval: 探测间隔（秒）
+            timeout: 单次探测超时（秒）
+            degraded_rtt_ms: 平均 RTT 超过该值时视为 degraded
+            degraded_error_rate: 窗口内错误率达到该值时视为 degraded
+            error_after: 连续失败多少次后视为 error
+            measure_rtt: 是否记录 RTT；探测结果不能代表该服务器自身延迟时设为 False，只统计存活与错误率
+        """
+        self._probes[name] = probe
+        self._options[name] = {
+            "interval": interval,
+            "timeout": timeout,
+            "degraded_rtt_ms": degraded_rtt_ms,
+            "degraded_error_rate": degraded_error_rate,
+            "error_after": error_after,
+            "measure_rtt": measure_rtt,
+        }
+        self.health[name] = ServerHealth(name, self.window, measure_rtt)
+
+    def start(self):
+        """为每个已注册的服务器启动独立的探测任务"""
+        for name in self._probes:
+            if name not in self._tasks or self._tasks[name].done():
+                self._tasks[name] = asyncio.create_task(self._run(name))
+        logger.info(f"健康探测已启动: {list(self._probes.keys())}")
+
+    async def stop(self):
+        """停止所有探测任务"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(self, name: str):
+        """单个服务器的探测循环"""
+        interval = self._options[name]["interval"]
+        try:
+            while True:
+                await self.probe_once(name)
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            pass
+
+    async def probe_once(self, name: str) -> ServerHealth:
+        """立即探测一次指定服务器并更新状态"""
+        health = self.health[name]
+        options = self._options[name]
+        start = time.perf_counter()
+        try:
+            measured = await asyncio.wait_for(self._probes[name](), timeout=options["timeout"])
+            if not options["measure_rtt"]:
+                rtt_ms = None
+            elif measured is not None:
+                rtt_ms = measured
+            else:
+                rtt_ms = (time.perf_counter() - start) * 1000
+            health.record(True, rtt_ms)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            health.record(False, None, f"探测超时 ({options['timeout']}s)")
+        except Exception as e:
+            health.record(False, None, str(e) or type(e).__name__)
+
+        previous = health.status
+        health.status = self._classify(health, options)
+        if health.status != previous:
+            logger.info(f"服务器 {name} 健康状态变化: {previous} -> {health.status}")
+
+        if self.on_status:
+            try:
+                error = health.last_error if health.status != "running" else None
+                self.on_status(name, health.status, error, health.latency())
+            except Exception as e:
+                logger.error(f"健康状态回调执行失败: {e}")
+        return health
+
+    def _classify(self, health: ServerHealth, options: dict) -> str:
+        """根据统计数据判定状态: starting / running / degraded / error"""
+        if health.consecutive_failures >= options["error_after"]:
+            return "error"
+        # 尚未成功过（如首次连接较慢）时保持 starting，仍视为可用
+        if not health.has_succeeded:
+            return "starting"
+        if health.consecutive_failures > 0:
+            return "degraded"
+        if health.error_rate >= options["degraded_error_rate"]:
+            return "degraded"
+        avg_rtt = health.avg_rtt_ms
+        if avg_rtt is not None and avg_rtt > options["degraded_rtt_ms"]:
+            return "degraded"
+        return "running"
+
+    def get_status(self, name: str) -> Optional[str]:
+        """获取服务器当前健康状态，未注册时返回 None"""
+        health = self.health.get(name)
+        return health.status if health else None
+
+    def is_available(self, name: str) -> bool:
+        """服务器是否可以接收请求（未注册或非 error 状态均视为可用）"""
+        return self.get_status(name) != "error"
+
+    def pick_healthy(self, candidates: Iterable[str]) -> Optional[str]:
+        """
+        从候选服务器中挑选最健康的一个
+
+        优先 running，其次 degraded，同状态下按平均 RTT 从小到大；全部不可用时返回 None
+        """
+        rank = {"running": 0, "starting": 1, "degraded": 2}
+        available = [name for name in candidates if name in self.health and self.is_available(name)]
+        if not available:
+            return None
+
+        def _key(name: str):
+            health = self.health[name]
+            avg_rtt = health.avg_rtt_ms
+            return (rank.get(health.status, 3), avg_rtt if avg_rtt is not None else float("inf"))
+
+        return min(available, key=_key)
+
+    def snapshot(self) -> dict:
+        """返回所有服务器的状态与延迟统计"""
+        return {
+            name: {"status": health.status, "error": health.last_error, "latency": health.latency()}
+            for name, health in self.health.items()
+        }
@@ -0,0 +1,74 @@
+"""
+stdio MCP 服务器启动器
+
+由 ServerSupervisor 注入到 stdio 服务器的启动命令前，只依赖标准库：
+设置 rlimit、创建独立进程组、写入 pid 文件，然后 exec 真正的命令。
+exec 之后 pid 不变，supervisor 可以据此采样和回收整个进程组。
+
+用法: python launcher.py --pidfile PATH [--max-vm-mb N] [--max-fds N] [--nice N] -- command [args...]
+
+CPU 控制：--nice 降低服务器的调度优先级（0-19，由子进程继承），让其在争抢 CPU 时让路；
+持续占用上限由 supervisor 的 cpu_percent 预算负责，连续超出时重启服务器。
+不使用 RLIMIT_CPU：它限制的是累计 CPU 时间，长期运行的服务器即使负载很低也会被 SIGXCPU 终止。
+"""
+import argparse
+import os
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore
+
+
+def _set_limit(name: str, value: int):
+    """设置 rlimit，软硬限制都不超过当前硬限制"""
+    if resource is None or not hasattr(resource, name):
+        return
+    limit = getattr(resource, name)
+    _, hard = resource.getrlimit(limit)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    try:
+        resource.setrlimit(limit, (value, hard))
+    except (ValueError, OSError) as e:
+        print(f"launcher: 设置 {name}={value} 失败: {e}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pidfile", required=True)
+    parser.add_argument("--max-vm-mb", type=int, default=0)
+    parser.add_argument("--max-fds", type=int, default=0)
+    parser.add_argument("--nice", type=int, default=0)
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    command = args.command
+    if command and command[0] == "--":
+        command = command[1:]
+    if not command:
+        parser.error("缺少要启动的命令")
+
+    if args.max_vm_mb > 0:
+        _set_limit("RLIMIT_AS", args.max_vm_mb * 1024 * 1024)
+    if args.max_fds > 0:
+        _set_limit("RLIMIT_NOFILE", args.max_fds)
+    if args.nice > 0 and hasattr(os, "nice"):
+        try:
+            os.nice(args.nice)
+        except OSError as e:
+            print(f"launcher: 设置 nice={args.nice} 失败: {e}", file=sys.stderr)
+
+    # 独立进程组，方便 supervisor 统计和回收 uvx 派生的子进程
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    with open(args.pidfile, "w") as f:
+        f.write(str(os.getpid()))
+
+    os.execvp(command[0], command)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,17 @@
 from xiaozhi_app.plugins.android import AndroidDevice
-from typing import Optional, Callable
+from typing import Optional, Union
 from xiaozhi_app.core import MCPProxy
 from importlib.resources import files
-from .config_server import ConfigServer
+from .config_server import ConfigServer, ThreadedConfigServer
+from .health import DEFAULT_PROBE_TIMEOUT, HealthProber, parse_health_options
+from .supervisor import ServerSupervisor
 from fastmcp import Client
 import logging
 import asyncio
 import json
 import argparse
 import os
+import time
 
 logging.basicConfig(level=logging.INFO)
 
@@ -94,16 +97,15 @@ def init_files(config_path: str):
         logging.error(f"初始化证书文件时发生未知错误: {e}")
 
 class ClientTool:
-    def __init__(self, client: Client, loop: asyncio.AbstractEventLoop, config_dir: str, restart_callback: Callable[[], None]):
+    def __init__(self, client: Client, loop: asyncio.AbstractEventLoop, server: Union[ConfigServer, ThreadedConfigServer],
+                 supervisor: Optional[ServerSupervisor] = None):
         self.client: Client = client
         self.loop: asyncio.AbstractEventLoop = loop
-        self.server = ConfigServer(
-            config_dir=config_dir,
-            port=0,  # 可以指定端口或使用 0 自动分配
-            on_config_update=self.on_update
-        )
-        # Callback to signal the main manager to restart the client
-        self.restart_callback = restart_callback
+        # Config server is owned by ClientManager and outlives client restarts
+        self.server = server
+        # Health prober for the current client session, set by ClientManager
+        self.health: Optional[HealthProber] = None
+        self.supervisor = supervisor
 
     async def _deal_server(self, arguments: dict) -> str:
         try:
@@ -114,6 +116,13 @@ class ClientTool:
             if action == "start":
                 if not is_running:
                     data["url"] = await self.server.start()
+                    # Seed the UI with the latest probe results instead of waiting for the next round
+                    if self.health:
+                        for server_name, entry in self.health.snapshot().items():
+                            self.server.update_server_status(server_name, entry["status"], entry["error"], entry["latency"])
+                    if self.supervisor:
+                        for server_name, usage in self.supervisor.usage.items():
+                            self.server.update_server_usage(server_name, usage)
                 else:
                     message = "already running"
             elif action == "stop":
@@ -138,6 +147,12 @@ class ClientTool:
             logging.info(f"invoke tool: {name} arguments: {mcp_arguments}")
             if name == "plugin-mcp-app-config-server":
                 return await self._deal_server(mcp_arguments)
+            server_name = self._server_for_tool(name)
+            if server_name and self.health and not self.health.is_available(server_name):
+                # Fail fast instead of waiting for the call timeout on a server known to be down
+                health = self.health.health[server_name]
+                logging.warning(f"invoke tool: {name} rejected, server '{server_name}' is unhealthy: {health.last_error}")
+                return json.dumps({"error": f"server '{server_name}' is unavailable: {health.last_error}"}, ensure_ascii=False)
             result = await self.client.call_tool(name, mcp_arguments, timeout=30)
             logging.info(f"invoke tool: {name} end, arguments: {arguments}, result: {result.structured_content}")
             content = ""
@@ -166,15 +181,23 @@ class ClientTool:
         )
         return future.result(timeout=35)  # 稍微大于invoke_tool中的timeout
 
-    async def on_update(self, config_data):
-        """配置更新回调示例, now triggers a client restart."""
-        logging.info(f"配置已更新: {config_data}, 正在触发客户端重启...")
-        if self.restart_callback:
-            self.restart_callback()
+    def _server_for_tool(self, name: str) -> Optional[str]:
+        """Resolve which configured server a (possibly prefixed) tool name belongs to."""
+        if not self.health or not self.health.health:
+            return None
+        if len(self.health.health) == 1:
+            return next(iter(self.health.health))
+        # Server names may contain "_" themselves (e.g. home_assistant), so match the longest prefix
+        matches = [server for server in self.health.health if name.startswith(f"{server}_")]
+        return max(matches, key=len) if matches else None
+
+    def update_server_status(self, server_name: str, status: str, error: Optional[str] = None, latency: Optional[dict] = None):
+        if self.server.is_running():
+            self.server.update_server_status(server_name, status, error, latency)
 
-    def update_server_status(self, server_name: str, status: str, error: Optional[str] = None):
+    def update_server_usage(self, server_name: str, usage: dict):
         if self.server.is_running():
-            self.server.update_server_status(server_name, status, error)
+            self.server.update_server_usage(server_name, usage)
 
     def invoke_global_tool(self, name: str, arguments: dict) -> str:
         dealed_arguments = {}
@@ -203,22 +226,123 @@ class ClientTool:
 
 class ClientManager:
     """Manages the lifecycle of the MCP client and its tools."""
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, config_server_mode: str = "thread", config_server_idle_timeout: float = 600):
         self.config_path = config_path
         self.mcp_proxy = MCPProxy()
         self.loop = asyncio.get_running_loop()
         self._restart_required = asyncio.Event()
+        # In "thread" mode the config server runs on its own event loop so UI traffic
+        # never competes with proxied tool calls on this loop.
+        if config_server_mode == "thread":
+            self.config_server = ThreadedConfigServer(
+                config_dir=config_path,
+                port=0,  # 可以指定端口或使用 0 自动分配
+                on_config_update=self.on_config_update,
+                idle_timeout=config_server_idle_timeout,
+                loop=self.loop
+            )
+        else:
+            self.config_server = ConfigServer(
+                config_dir=config_path,
+                port=0,  # 可以指定端口或使用 0 自动分配
+                on_config_update=self.on_config_update,
+                idle_timeout=config_server_idle_timeout
+            )
+        # Lives across client restarts so uv resolution state and restart counts survive
+        self.supervisor = ServerSupervisor(config_path, on_restart=self.trigger_restart)
 
     def trigger_restart(self):
         """Sets the event to signal that a restart is required."""
         self._restart_required.set()
 
+    async def close(self):
+        """Stop background work and shut down the config server (and its thread in "thread" mode)."""
+        await self.supervisor.stop()
+        if isinstance(self.config_server, ThreadedConfigServer):
+            await self.config_server.close()
+        elif self.config_server.is_running():
+            await self.config_server.stop()
+
+    def on_config_update(self, config_data: dict):
+        """Config server callback, always delivered on the manager loop; triggers a client restart."""
+        logging.info(f"配置已更新: {config_data}, 正在触发客户端重启...")
+        self.trigger_restart()
+
+    def _create_prober(self, client: Client, config: dict, client_tool: ClientTool) -> tuple[HealthProber, list[Client]]:
+        """
+        Build a health prober with one probe per configured server.
+
+        Remote (url based) servers get a dedicated probe client so their RTT is measured in
+        isolation. Stdio servers are probed through the shared client to avoid spawning a
+        second process: a single server is pinged directly, otherwise its prefixed tools
+        must still be listed. That listing fans out to every backend, so it is shared by all
+        stdio probes within a round and only reports liveness, not per-server RTT.
+        Per-server tuning comes from an optional "health" entry.
+        """
+        prober = HealthProber(on_status=client_tool.update_server_status)
+        probe_clients: list[Client] = []
+        server_configs = config.get("mcpServers", {})
+        health_options = {name: parse_health_options(name, server_config.get("health"))
+                          for name, server_config in server_configs.items()}
+        # The shared listing gets its own deadline so a hung list_tools cannot pin every stdio probe
+        listing_timeout = min((options.get("timeout", DEFAULT_PROBE_TIMEOUT)
+                               for name, options in health_options.items() if "url" not in server_configs[name]),
+                              default=DEFAULT_PROBE_TIMEOUT)
+        shared_listing: dict = {"task": None, "at": 0.0}
+
+        def retrieve_listing_result(task: asyncio.Future):
+            # Consume the outcome even when every waiter already timed out
+            if not task.cancelled():
+                task.exception()
+
+        async def list_tools_shared():
+            task = shared_listing["task"]
+            if task is None or (task.done() and time.monotonic() - shared_listing["at"] > 5):
+                task = asyncio.ensure_future(asyncio.wait_for(client.list_tools(), timeout=listing_timeout))
+                task.add_done_callback(retrieve_listing_result)
+                shared_listing.update(task=task, at=time.monotonic())
+            # Shield so one probe timing out does not cancel the listing for the others
+            return await asyncio.shield(task)
+
+        for name, server_config in server_configs.items():
+            if "url" in server_config:
+                probe_client = Client({"mcpServers": {name: server_config}})
+                probe_clients.append(probe_client)
+
+                async def probe(probe_client=probe_client) -> float:
+                    if not probe_client.is_connected():
+                        await probe_client.__aenter__()
+                    start = time.perf_counter()
+                    try:
+                        await probe_client.ping()
+                    except Exception:
+                        # Drop the session so the next round reconnects
+                        await probe_client.close()
+                        raise
+                    return (time.perf_counter() - start) * 1000
+            elif len(server_configs) == 1:
+                async def probe() -> None:
+                    await client.ping()
+            else:
+                async def probe(prefix=f"{name}_") -> None:
+                    tools = await list_tools_shared()
+                    if not any(tool.name.startswith(prefix) for tool in tools):
+                        raise RuntimeError("no tools available")
+
+            options = health_options[name]
+            measure_rtt = "url" in server_config or len(server_configs) == 1
+            prober.add_server(name, probe, measure_rtt=measure_rtt, **options)
+
+        return prober, probe_clients
+
     async def run(self):
         """Main application loop that handles client connection and restarts."""
         if not self.mcp_proxy.connect():
             logging.error("connect to mcp failed")
             return
 
+        self.supervisor.start()
+
         while True:
             self._restart_required.clear()
 
@@ -233,16 +357,21 @@ class ClientManager:
             servers = {key: False for key in config.get("mcpServers", {})}
             logging.info(f"Attempting to connect client with servers: {list(servers.keys())}")
 
-            client = Client(config)
+            client = Client(self.supervisor.prepare_config(config))
 
             try:
                 async with client:
-                    client_tool = ClientTool(client, self.loop, self.config_path, self.trigger_restart)
+                    client_tool = ClientTool(client, self.loop, self.config_server, self.supervisor)
+                    self.supervisor.on_usage = client_tool.update_server_usage
                     self.mcp_proxy.call_mcp_tool = client_tool.invoke_tool_sync
 
                     await client.ping()
                     logging.info("Client connected successfully. Entering operational loop.")
 
+                    prober, probe_clients = self._create_prober(client, config, client_tool)
+                    client_tool.health = prober
+                    prober.start()
+
                     # This inner loop runs as long as the client is connected and no restart is requested.
                     while not self._restart_required.is_set():
                         try:
@@ -254,15 +383,18 @@ class ClientManager:
 
                             for tool in tools:
                                 if len(servers) > 1:
-                                    try:
-                                        title, name = tool.name.split("_", maxsplit=1)
-                                        if title in servers:
-                                            servers[title] = True
-                                    except ValueError:
+                                    # Server names may contain "_" themselves (e.g. home_assistant), so match the longest prefix
+                                    title = max((s for s in servers if tool.name.startswith(f"{s}_")), key=len, default=None)
+                                    if title:
+                                        servers[title] = True
+                                        self.supervisor.mark_resolved(title)
+                                    else:
                                         logging.warning(f"Could not parse server title from tool name: {tool.name}")
                                 discovered_tools.append(tool.model_dump())
 
                             self.mcp_proxy.set_tools(discovered_tools)
+                            if len(servers) == 1 and tools:
+                                self.supervisor.mark_resolved(next(iter(servers)))
 
                             all_servers_ready = all(servers.values())
                             if not all_servers_ready and len(servers) > 1:
@@ -271,8 +403,6 @@ class ClientManager:
                                         logging.info(f"Server '{k}' is not ready yet.")
 
                             logging.info("Client operational. Checking for updates...")
-                            for item in servers.keys():
-                                client_tool.update_server_status(item, "running")
 
                             # Wait for the restart signal, with a timeout to allow periodic work.
                             logging.info("plugin-mcp-app start success")
@@ -286,7 +416,17 @@ class ClientManager:
                             # Break inner loop to trigger a reconnect.
                             break
 
+                    # Processes are about to be shut down on purpose; don't treat that as a crash
+                    self.supervisor.release()
+                    await prober.stop()
+                    for probe_client in probe_clients:
+                        try:
+                            await probe_client.close()
+                        except Exception as e:
+                            logging.warning(f"Failed to close probe client: {e}")
+
             except Exception as e:
+                self.supervisor.release()
                 logging.error(f"Client connection failed or was lost: {e}. Retrying in 10 seconds.")
                 await asyncio.sleep(10)
 
@@ -300,13 +440,20 @@ class ClientManager:
 async def main_client():
     argparser = argparse.ArgumentParser()
     argparser.add_argument("--config_dir", help="Configuration file directory", default="config")
+    argparser.add_argument("--config_server_mode", help="Run the config server on its own loop thread or inline on the tool-call loop",
+                           choices=["thread", "inline"], default="thread")
+    argparser.add_argument("--config_server_idle_timeout", help="Stop the config server after this many idle seconds (0 disables)",
+                           type=float, default=600)
     args = argparser.parse_args()
     config_path = args.config_dir
 
     init_files(config_path)
 
-    manager = ClientManager(config_path)
-    await manager.run()
+    manager = ClientManager(config_path, args.config_server_mode, args.config_server_idle_timeout)
+    try:
+        await manager.run()
+    finally:
+        await manager.close()
 
 def main():
     try:
@@ -0,0 +1,390 @@
+import asyncio
+import copy
+import logging
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LAUNCHER_PATH = Path(__file__).parent / "launcher.py"
+PROC_PATH = Path("/proc")
+
+# 资源使用回调: (server_name, usage)
+UsageCallback = Callable[[str, dict], None]
+
+# mcp_servers.json 中 "limits" 配置项允许的字段、类型及取值范围 (类型, 最小值, 最大值)
+LIMIT_OPTION_TYPES = {
+    "memory_mb": (float, 1, None),
+    "cpu_percent": (float, 1, None),
+    "max_vm_mb": (int, 1, None),
+    "max_fds": (int, 1, None),
+    "nice": (int, 0, 19),
+}
+
+
+def parse_limits(name: str, options) -> dict:
+    """
+    校验服务器配置中的 "limits" 项，忽略未知字段和无效的值（记录警告而不抛出异常）
+
+    Args:
+        name: 服务器名称，仅用于日志
+        options: 配置中的原始 "limits" 值
+
+    Returns:
+        校验后的限制配置
+    """
+    if options is None:
+        return {}
+    if not isinstance(options, dict):
+        logger.warning(f"服务器 {name} 的 limits 配置不是对象，已忽略: {options!r}")
+        return {}
+    parsed = {}
+    for key, value in options.items():
+        if key not in LIMIT_OPTION_TYPES:
+            logger.warning(f"服务器 {name} 的 limits 配置包含未知字段，已忽略: {key}")
+            continue
+        value_type, minimum, maximum = LIMIT_OPTION_TYPES[key]
+        try:
+            if isinstance(value, bool):
+                raise ValueError("布尔值无效")
+            converted = value_type(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"服务器 {name} 的 limits 配置 {key}={value!r} 无效，已忽略: {e}")
+            continue
+        if converted < minimum or (maximum is not None and converted > maximum):
+            logger.warning(f"服务器 {name} 的 limits 配置 {key}={value!r} 超出范围 "
+                           f"[{minimum}, {maximum if maximum is not None else '∞'}]，已忽略")
+            continue
+        parsed[key] = converted
+    return parsed
+
+
+def _read_proc_stat(pid: int) -> Optional[tuple]:
+    """读取 /proc/<pid>/stat，返回 (pgrp, cpu_ticks, rss_pages)"""
+    try:
+        content = (PROC_PATH / str(pid) / "stat").read_text()
+    except OSError:
+        return None
+    # comm 字段可能包含空格，从最后一个 ')' 之后开始解析
+    fields = content[content.rfind(")") + 2:].split()
+    # 僵尸进程已退出，只是还未被回收，不再计入
+    if not fields or fields[0] in ("Z", "X"):
+        return None
+    try:
+        pgrp = int(fields[2])
+        cpu_ticks = int(fields[11]) + int(fields[12])
+        rss_pages = int(fields[21])
+    except (IndexError, ValueError):
+        return None
+    return pgrp, cpu_ticks, rss_pages
+
+
+def _count_fds(pid: int) -> int:
+    try:
+        return len(os.listdir(PROC_PATH / str(pid) / "fd"))
+    except OSError:
+        return 0
+
+
+class ProcessGroupStats:
+    """一个 stdio 服务器进程组的资源采样结果"""
+
+    def __init__(self, pids: list, rss_bytes: int, cpu_seconds: float, fds: int):
+        self.pids = pids
+        self.rss_bytes = rss_bytes
+        self.cpu_seconds = cpu_seconds
+        self.fds = fds
+
+
+def scan_process_groups(pgids: set) -> Dict[int, ProcessGroupStats]:
+    """
+    单次遍历 /proc，按进程组汇总 RSS、CPU 时间和文件描述符数
+
+    只统计 pgids 中的进程组，不存在的进程组不会出现在结果中。这里是阻塞 I/O，应在线程中调用。
+    """
+    if not pgids or not PROC_PATH.is_dir():
+        return {}
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    ticks = os.sysconf("SC_CLK_TCK")
+    groups: Dict[int, list] = {}  # {pgid: [pids, rss_bytes, cpu_ticks, fds]}
+    for entry in PROC_PATH.iterdir():
+        if not entry.name.isdigit():
+            continue
+        pid = int(entry.name)
+        stat = _read_proc_stat(pid)
+        if stat is None or stat[0] not in pgids:
+            continue
+        group = groups.setdefault(stat[0], [[], 0, 0, 0])
+        group[0].append(pid)
+        group[1] += stat[2] * page_size
+        group[2] += stat[1]
+        group[3] += _count_fds(pid)
+    return {
+        pgid: ProcessGroupStats(pids, rss_bytes, cpu_ticks / ticks, fds)
+        for pgid, (pids, rss_bytes, cpu_ticks, fds) in groups.items()
+    }
+
+
+class ServerSupervisor:
+    """stdio MCP 服务器的资源监管：rlimit、资源采样、超出内存/CPU 预算或进程退出时自动重启、共享 uv 缓存"""
+
+    def __init__(
+        self,
+        config_dir: str,
+        on_restart: Optional[Callable[[], None]] = None,
+        on_usage: Optional[UsageCallback] = None,
+        interval: float = 15.0,
+        over_budget_samples: int = 2,
+    ):
+        """
+        初始化监管器
+
+        Args:
+            config_dir: 配置文件目录，pid 文件和 uv 缓存放在其下
+            on_restart: 需要重启 MCP 客户端时的回调
+            on_usage: 每次采样后调用的资源使用回调
+            interval: 采样间隔（秒）
+            over_budget_samples: 连续多少次超出内存或 CPU 预算后重启
+        """
+        # 传给子进程的 pid 文件和缓存路径必须是绝对路径，服务器可能配置了自己的 cwd
+        self.config_dir = Path(config_dir).resolve()
+        self.run_dir = self.config_dir / ".run"
+        self.uv_cache_dir = self.config_dir / ".cache" / "uv"
+        self.on_restart = on_restart
+        self.on_usage = on_usage
+        self.interval = interval
+        self.over_budget_samples = over_budget_samples
+
+        # 当前受监管的服务器: {server_name: limits}
+        self.limits: Dict[str, dict] = {}
+        # 最近一次采样结果: {server_name: usage}
+        self.usage: Dict[str, dict] = {}
+        self._last_cpu: Dict[str, tuple] = {}
+        # 连续超出预算的次数: {(server_name, "memory_mb" | "cpu_percent"): int}
+        self._over_budget: Dict[tuple, int] = {}
+        self._restarts: Dict[str, int] = {}
+        # 本次启动后已采样到存活的进程组: {server_name: pid}，用于发现进程意外退出
+        self._alive: Dict[str, int] = {}
+        # 已成功解析过 uv 环境的启动命令，重启时可以离线复用缓存
+        self._resolved: Dict[str, tuple] = {}
+        self._launched: Dict[str, tuple] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _pidfile(self, name: str) -> Path:
+        return self.run_dir / f"{name}.pid"
+
+    @staticmethod
+    def _is_uv_command(command: str) -> bool:
+        return os.path.basename(command) in ("uv", "uvx")
+
+    def prepare_config(self, config: dict) -> dict:
+        """
+        改写配置中的 stdio 服务器，通过 launcher 启动以施加 rlimit 并记录 pid
+
+        返回新的配置字典，不修改传入的配置
+        """
+        config = copy.deepcopy(config)
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.release()
+
+        for name, server_config in config.get("mcpServers", {}).items():
+            command = server_config.get("command")
+            if not command or "url" in server_config:
+                continue
+            limits = parse_limits(name, server_config.get("limits"))
+            args = list(server_config.get("args", []))
+            pidfile = self._pidfile(name)
+            pidfile.unlink(missing_ok=True)
+
+            if self._is_uv_command(command):
+                env = server_config.setdefault("env", {})
+                env.setdefault("UV_CACHE_DIR", str(self.uv_cache_dir))
+                # 同一命令之前已成功启动过，直接离线使用缓存中的环境，跳过依赖解析
+                fingerprint = (command, tuple(args))
+                if self._resolved.pop(name, None) == fingerprint:
+                    env.setdefault("UV_OFFLINE", "1")
+                    logger.info(f"服务器 {name} 复用已解析的 uv 环境")
+                self._launched[name] = fingerprint
+
+            server_config["command"] = sys.executable
+            server_config["args"] = [
+                str(LAUNCHER_PATH),
+                "--pidfile", str(pidfile),
+                "--max-vm-mb", str(limits.get("max_vm_mb", 0)),
+                "--max-fds", str(limits.get("max_fds", 0)),
+                "--nice", str(limits.get("nice", 0)),
+                "--",
+                command,
+                *args,
+            ]
+            self.limits[name] = limits
+            self._over_budget.pop((name, "memory_mb"), None)
+            self._over_budget.pop((name, "cpu_percent"), None)
+            self._last_cpu.pop(name, None)
+
+        return config
+
+    def mark_resolved(self, name: str):
+        """服务器工具已可用，说明其 uv 环境已解析完成，下次重启可以离线启动"""
+        if name in self._launched:
+            self._resolved[name] = self._launched[name]
+
+    def release(self):
+        """当前客户端会话结束，进程将被正常关闭，不再监管（避免把正常退出误判为崩溃）"""
+        self.limits.clear()
+        self._alive.clear()
+
+    def _read_pid(self, name: str) -> Optional[int]:
+        try:
+            return int(self._pidfile(name).read_text().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _collect(self, names: list) -> Dict[str, tuple]:
+        """读取 pid 文件并单次扫描 /proc，返回 {server_name: (pid, stats)}（阻塞，在线程中执行）"""
+        pids = {name: self._read_pid(name) for name in names}
+        stats = scan_process_groups({pid for pid in pids.values() if pid})
+        return {name: (pid, stats.get(pid) if pid else None) for name, pid in pids.items()}
+
+    def _cpu_percent(self, name: str, stats: ProcessGroupStats) -> Optional[float]:
+        """根据两次采样的 CPU 时间差计算 CPU 占用（单核百分比，多核时可超过 100）"""
+        now = time.monotonic()
+        cpu_percent = None
+        if name in self._last_cpu:
+            last_time, last_cpu = self._last_cpu[name]
+            if now > last_time:
+                cpu_percent = max(0.0, (stats.cpu_seconds - last_cpu) / (now - last_time) * 100)
+        self._last_cpu[name] = (now, stats.cpu_seconds)
+        return cpu_percent
+
+    def _usage(self, name: str, pid: Optional[int], stats: Optional[ProcessGroupStats],
+               cpu_percent: Optional[float]) -> dict:
+        """根据采样结果生成单个服务器的资源使用情况"""
+        limits = self.limits.get(name, {})
+        usage = {
+            "pid": None,
+            "processes": 0,
+            "rss_mb": None,
+            "cpu_percent": None,
+            "fds": None,
+            "memory_mb": limits.get("memory_mb"),
+            "cpu_budget": limits.get("cpu_percent"),
+            "restarts": self._restarts.get(name, 0),
+        }
+        if stats is None:
+            return usage
+
+        usage.update({
+            "pid": pid,
+            "processes": len(stats.pids),
+            "rss_mb": round(stats.rss_bytes / 1024 / 1024, 1),
+            "cpu_percent": round(cpu_percent, 1) if cpu_percent is not None else None,
+            "fds": stats.fds,
+        })
+        return usage
+
+    def _kill(self, name: str, pid: int):
+        """结束整个进程组，立即释放资源"""
+        try:
+            os.killpg(pid, signal.SIGKILL)
+            logger.info(f"已结束服务器 {name} 的进程组: {pid}")
+        except (ProcessLookupError, PermissionError) as e:
+            logger.warning(f"结束服务器 {name} 进程组失败: {e}")
+
+    def _over_limit(self, name: str, key: str, value: Optional[float], label: str, unit: str) -> bool:
+        """记录一次预算检查，连续 over_budget_samples 次超出预算时返回 True"""
+        budget = self.limits[name].get(key)
+        if not budget or value is None or value <= budget:
+            self._over_budget[(name, key)] = 0
+            return False
+        count = self._over_budget.get((name, key), 0) + 1
+        self._over_budget[(name, key)] = count
+        logger.warning(f"服务器 {name} {label}超出预算: {value:.1f}{unit} > {budget}{unit} "
+                       f"({count}/{self.over_budget_samples})")
+        return count >= self.over_budget_samples
+
+    def _needs_restart(self, name: str, pid: Optional[int], stats: Optional[ProcessGroupStats],
+                       cpu_percent: Optional[float]) -> bool:
+        """判断服务器是否需要重启：进程组意外消失（如被 rlimit 终止），或连续超出内存/CPU 预算"""
+        if stats is None:
+            if name in self._alive:
+                logger.warning(f"服务器 {name} 的进程组 {self._alive[name]} 已退出")
+                self._alive.pop(name)
+                return True
+            return False
+        self._alive[name] = pid
+
+        # 两项都要检查，保证各自的计数都更新
+        over_memory = self._over_limit(name, "memory_mb", stats.rss_bytes / 1024 / 1024, "内存", "MB")
+        over_cpu = self._over_limit(name, "cpu_percent", cpu_percent, "CPU ", "%")
+        if not (over_memory or over_cpu):
+            return False
+        self._kill(name, pid)
+        self._alive.pop(name, None)
+        self._over_budget[(name, "memory_mb")] = 0
+        self._over_budget[(name, "cpu_percent")] = 0
+        return True
+
+    async def check(self) -> bool:
+        """
+        采样所有受监管的服务器，超出内存/CPU 预算时结束进程并触发重启，进程意外退出时同样触发重启
+
+        Returns:
+            是否触发了重启
+        """
+        names = list(self.limits)
+        if not names:
+            return False
+        samples = await asyncio.to_thread(self._collect, names)
+
+        restart = False
+        for name, (pid, stats) in samples.items():
+            # 会话可能在采样期间结束
+            if name not in self.limits:
+                continue
+            cpu_percent = self._cpu_percent(name, stats) if stats is not None else None
+            if self._needs_restart(name, pid, stats, cpu_percent):
+                self._restarts[name] = self._restarts.get(name, 0) + 1
+                restart = True
+                stats = None
+
+            usage = self._usage(name, pid, stats, cpu_percent)
+            self.usage[name] = usage
+            if self.on_usage:
+                try:
+                    self.on_usage(name, usage)
+                except Exception as e:
+                    logger.error(f"资源使用回调执行失败: {e}")
+
+        if restart and self.on_restart:
+            self.on_restart()
+        return restart
+
+    async def _run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.check()
+                except Exception as e:
+                    logger.error(f"资源采样失败: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    def start(self):
+        """启动后台采样任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("stdio 服务器资源监管已启动")
+
+    async def stop(self):
+        """停止后台采样任务"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None